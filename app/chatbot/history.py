@@ -1,18 +1,67 @@
+import logging
 import uuid
-from collections import defaultdict
-from typing import Dict, List
-from langchain_core.messages import AIMessage, HumanMessage
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from cachetools import TTLCache
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_openai import ChatOpenAI
 
-conversation_histories: Dict[str, List] = defaultdict(list)
+from app.core.config import OPENAI_API_KEY, OPENAI_SUMMARY_MODEL
+
+logger = logging.getLogger(__name__)
+
+MAX_TURNS = 6
+MAX_CONVERSATIONS = 10_000
+HISTORY_TTL_SECONDS = 3600
+
+conversation_histories: TTLCache = TTLCache(maxsize=MAX_CONVERSATIONS, ttl=HISTORY_TTL_SECONDS)
+conversation_summaries: TTLCache = TTLCache(maxsize=MAX_CONVERSATIONS, ttl=HISTORY_TTL_SECONDS)
+
+summary_llm = ChatOpenAI(model=OPENAI_SUMMARY_MODEL, api_key=OPENAI_API_KEY, temperature=0, max_retries=3, timeout=20)
+
+# update_history runs on the event loop; the summary LLM call is a
+# blocking OpenAI round-trip, so it runs here instead. A single worker
+# keeps summaries for a conversation applied in submission order.
+_summary_executor = ThreadPoolExecutor(max_workers=1)
+
+SUMMARY_PROMPT = (
+    "Résumez la conversation suivante en quelques phrases, en conservant les "
+    "sujets abordés et les informations importantes pour la suite de l'échange. "
+    "Si un résumé précédent est fourni, intégrez-le.\n\n"
+    "Résumé précédent:\n{previous}\n\nNouveaux messages:\n{transcript}\n\nRésumé:"
+)
 
 def get_or_create_conversation_id(conversation_id: str = None) -> str:
     return conversation_id if conversation_id else str(uuid.uuid4())
 
 def get_history(conversation_id: str) -> List:
-    return conversation_histories.get(conversation_id, [])
+    history = list(conversation_histories.get(conversation_id, []))
+    summary = conversation_summaries.get(conversation_id)
+    if summary:
+        history.insert(0, SystemMessage(content=f"Résumé de la conversation précédente: {summary}"))
+    return history
+
+def _summarize_dropped(conversation_id: str, dropped_messages: List):
+    transcript = "\n".join(f"{message.type}: {message.content}" for message in dropped_messages)
+    previous = conversation_summaries.get(conversation_id, "")
+    try:
+        summary = summary_llm.invoke(
+            SUMMARY_PROMPT.format(previous=previous, transcript=transcript)
+        ).content
+        conversation_summaries[conversation_id] = summary
+    except Exception as e:
+        logger.warning(f"Failed to summarize history for conversation {conversation_id}: {e}")
 
 def update_history(conversation_id: str, question: str, answer: str):
-    conversation_histories[conversation_id].extend([
+    history = conversation_histories.get(conversation_id, [])
+    history.extend([
         HumanMessage(content=question),
         AIMessage(content=answer)
-    ])
\ No newline at end of file
+    ])
+    overflow = len(history) - 2 * MAX_TURNS
+    if overflow > 0:
+        # Fire-and-forget: the trimmed history is usable immediately and
+        # the summary lands in conversation_summaries when ready.
+        _summary_executor.submit(_summarize_dropped, conversation_id, history[:overflow])
+        history = history[overflow:]
+    conversation_histories[conversation_id] = history
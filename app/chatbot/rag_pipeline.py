@@ -1,30 +1,114 @@
+import asyncio
 import logging
+import re
+from functools import lru_cache
 
+import tiktoken
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
 
-from app.core.config import OPENAI_API_KEY, OPENAI_LLM_MODEL, TEXT_VECTOR_NAME, IMAGE_VECTOR_NAME, VIDEO_VECTOR_NAME, AUDIO_VECTOR_NAME
+from app.core.config import OPENAI_API_KEY, OPENAI_LLM_MODEL, OPENAI_MAX_CONCURRENCY, TEXT_VECTOR_NAME, IMAGE_VECTOR_NAME, VIDEO_VECTOR_NAME, AUDIO_VECTOR_NAME
+from app.core import embedding_cache
 from app.models.encoders import encoder
-from app.db.qdrant_ops import search_similar_content
+from app.db.qdrant_ops import aquery_fused_content, asearch_similar_content
 from app.models.schemas import SourceDocument
 
 logger = logging.getLogger(__name__)
 
-llm = ChatOpenAI(model=OPENAI_LLM_MODEL, api_key=OPENAI_API_KEY, temperature=0.2)
+llm = ChatOpenAI(model=OPENAI_LLM_MODEL, api_key=OPENAI_API_KEY, temperature=0.2, max_retries=6, timeout=30)
+
+# Cap in-flight OpenAI calls so a burst of questions queues instead of
+# tripping the account rate limit; retries above handle transient 429s.
+_llm_semaphore = asyncio.Semaphore(OPENAI_MAX_CONCURRENCY)
+
+# Text score above which a non-visual query is served from the text index
+# alone, skipping the image/video shards.
+TEXT_CONFIDENCE_THRESHOLD = 0.6
+
+# Hard cap on prompt context size so a run of long chunks cannot balloon
+# input-token cost or trip the model's context limit.
+CONTEXT_TOKEN_BUDGET = 2500
+
+_tokenizer = None
+_tokenizer_load_attempted = False
+
+def _get_tokenizer():
+    """Resolve the tokenizer lazily, on the first context build.
+
+    encoding_for_model downloads the BPE vocabulary when it isn't cached
+    on disk, so resolving it at import time can crash startup in an
+    offline environment. If neither the model encoding nor the o200k_base
+    fallback can be loaded, returns None and token counts are estimated.
+    """
+    global _tokenizer, _tokenizer_load_attempted
+    if not _tokenizer_load_attempted:
+        _tokenizer_load_attempted = True
+        try:
+            _tokenizer = tiktoken.encoding_for_model(OPENAI_LLM_MODEL)
+        except Exception:
+            try:
+                _tokenizer = tiktoken.get_encoding("o200k_base")
+            except Exception as e:
+                logger.warning(f"tiktoken unavailable, estimating token counts instead: {e}")
+    return _tokenizer
+
+_context_token_counts = {}
+
+def _count_tokens(point_id, text):
+    """Token count per context fragment, cached by point id across turns."""
+    count = _context_token_counts.get(point_id)
+    if count is None:
+        tokenizer = _get_tokenizer()
+        if tokenizer is not None:
+            count = len(tokenizer.encode(text))
+        else:
+            # ~4 chars per token is close enough to keep the budget honest.
+            count = max(1, len(text) // 4)
+        if len(_context_token_counts) > 4096:
+            _context_token_counts.clear()
+        _context_token_counts[point_id] = count
+    return count
+
+_VISUAL_QUERY_RE = re.compile(
+    r"image|photo|picture|diagram|chart|graph|figure"
+    r"|illustration|screenshot|visual|voir|montrer|afficher"
+    r"|sch[ée]ma|graphique|diagramme|capture|[ée]cran",
+    re.IGNORECASE
+)
 
 def is_visual_query(query):
     """Detect if the query is asking about visual content"""
-    visual_keywords = [
-        'image', 'photo', 'picture', 'diagram', 'chart', 'graph', 'figure',
-        'illustration', 'screenshot', 'visual', 'voir', 'montrer', 'afficher',
-        'schéma', 'graphique', 'diagramme', 'capture', 'écran'
-    ]
-    query_lower = query.lower()
-    return any(keyword in query_lower for keyword in visual_keywords)
+    return bool(_VISUAL_QUERY_RE.search(query))
+
+@lru_cache(maxsize=2048)
+def _encode_query_cached(normalized_query):
+    cached = embedding_cache.get_embedding("emb", normalized_query)
+    if cached is not None:
+        return tuple(cached)
+    embedding = encoder.encode_text(normalized_query)
+    embedding_cache.set_embedding("emb", normalized_query, embedding)
+    return tuple(embedding)
+
+def encode_query(query):
+    """Encode a query, reusing cached embeddings for repeated questions."""
+    return list(_encode_query_cached(query.strip().lower()))
+
+@lru_cache(maxsize=2048)
+def _encode_clip_query_cached(normalized_query):
+    cached = embedding_cache.get_embedding("clip-emb", normalized_query)
+    if cached is not None:
+        return tuple(cached)
+    embedding = encoder.encode_clip_text(normalized_query)
+    embedding_cache.set_embedding("clip-emb", normalized_query, embedding)
+    return tuple(embedding) if embedding else None
+
+def encode_clip_query(query):
+    """Encode a query with the CLIP text tower for image/video search."""
+    embedding = _encode_clip_query_cached(query.strip().lower())
+    return list(embedding) if embedding else None
 
-RAG_PROMPT_TEMPLATE = """
+RAG_SYSTEM_PROMPT = """
 # ROLE ET OBJECTIF
 Vous êtes "Epitome AI", l'assistant pédagogique officiel de l'Epitome Academy. Votre unique mission est d'aider les apprenants en répondant à leurs questions de manière précise, factuelle et encourageante.
 
@@ -78,9 +162,9 @@ Je suis désolé, mais je n'ai pas pu trouver d'information précise à ce sujet
 ---
 
 Maintenant, analysez la situation actuelle et répondez à la question de l'utilisateur.
+"""
 
---------------------------------------------------------------------------------
-CONTEXTE:
+RAG_USER_PROMPT = """CONTEXTE:
 {context}
 
 HISTORIQUE DE LA CONVERSATION:
@@ -92,67 +176,66 @@ QUESTION:
 RÉPONSE:
 """
 
-prompt = ChatPromptTemplate.from_template(RAG_PROMPT_TEMPLATE)
+prompt = ChatPromptTemplate.from_messages([
+    ("system", RAG_SYSTEM_PROMPT),
+    ("human", RAG_USER_PROMPT),
+])
 
-def retrieve_context(query, chat_history):
+async def retrieve_context(query, chat_history):
     logger.info(f"Récupération du contexte multimodal pour la question: '{query}'")
-    
+
     is_visual = is_visual_query(query)
-    
-    text_embedding = encoder.encode_text(query)
-    
-    all_hits = []
-    
-    if is_visual:
-        text_limit, image_limit, video_limit = 2, 3, 2
-        logger.info("Visual query detected - prioritizing image/video content")
-    else:
-        text_limit, image_limit, video_limit = 3, 2, 1
-    
-    text_hits = search_similar_content(
-        vector=text_embedding,
-        vector_name=TEXT_VECTOR_NAME,
-        limit=text_limit
-    )
-    all_hits.extend(text_hits)
-    
-    try:
-        image_embedding = encoder.encode_text(query)
-        image_hits = search_similar_content(
-            vector=image_embedding,
-            vector_name=IMAGE_VECTOR_NAME,
-            limit=image_limit
-        )
-        all_hits.extend(image_hits)
-        logger.info(f"Found {len(image_hits)} image results")
-    except Exception as e:
-        logger.warning(f"Image search failed: {e}")
-    
-    try:
-        video_hits = search_similar_content(
+
+    # Encoding is CPU-bound; keep it off the event loop so concurrent
+    # requests are not serialized behind a model forward pass.
+    text_embedding = await asyncio.to_thread(encode_query, query)
+
+    top_hits = None
+
+    if not is_visual:
+        # Textual query: probe the text index first and skip the image/video
+        # shards (and the CLIP encode) entirely when the top hit is confident.
+        text_hits = await asearch_similar_content(
             vector=text_embedding,
-            vector_name=VIDEO_VECTOR_NAME,
-            limit=video_limit
+            vector_name=TEXT_VECTOR_NAME,
+            limit=6
         )
-        all_hits.extend(video_hits)
-        logger.info(f"Found {len(video_hits)} video results")
-    except Exception as e:
-        logger.warning(f"Video search failed: {e}")
-    
-    all_hits.sort(key=lambda x: x.score, reverse=True)
-    
-    top_hits = all_hits[:6]
-    
+        if text_hits and text_hits[0].score > TEXT_CONFIDENCE_THRESHOLD:
+            logger.info("Confident text match - skipping image/video search")
+            top_hits = text_hits
+
+    if top_hits is None:
+        if is_visual:
+            text_limit, image_limit, video_limit = 2, 3, 2
+            logger.info("Visual query detected - prioritizing image/video content")
+        else:
+            text_limit, image_limit, video_limit = 3, 2, 1
+
+        clip_embedding = await asyncio.to_thread(encode_clip_query, query)
+
+        search_specs = [
+            (TEXT_VECTOR_NAME, text_embedding, text_limit),
+            (IMAGE_VECTOR_NAME, clip_embedding, image_limit),
+            (VIDEO_VECTOR_NAME, clip_embedding, video_limit),
+        ]
+        search_specs = [(name, vector, limit) for name, vector, limit in search_specs if vector]
+
+        # Scores from different encoders are not comparable, so let Qdrant fuse
+        # the per-modality rankings with RRF instead of sorting raw scores here.
+        top_hits = await aquery_fused_content(search_specs, limit=6)
+
+
     context_parts = []
+    used_tokens = 0
     for hit in top_hits:
         content_type = hit.payload.get('type', 'text')
         source_file = hit.payload.get('source_file', 'N/A')
         page_number = hit.payload.get('page_number', 'N/A')
-        
+
         if content_type == 'image':
             # For images, include description or metadata
             image_desc = hit.payload.get('text', 'Image sans description')
-            context_parts.append(
+            part = (
                 f"Source: {source_file}, Page: {page_number}\n"
                 f"Type: Image\n"
                 f"Description: {image_desc}"
@@ -160,18 +243,29 @@ def retrieve_context(query, chat_history):
         elif content_type == 'video':
             video_desc = hit.payload.get('text', 'Vidéo')
             timestamp = hit.payload.get('timestamp', 'N/A')
-            context_parts.append(
+            part = (
                 f"Source: {source_file}\n"
                 f"Type: Vidéo (timestamp: {timestamp})\n"
                 f"Description: {video_desc}"
             )
         else:
             text_content = hit.payload.get('text', '')
-            context_parts.append(
+            part = (
                 f"Source: {source_file}, Page: {page_number}\n"
                 f"Contenu: {text_content}"
             )
-    
+
+        part_tokens = _count_tokens(hit.id, part)
+        if used_tokens + part_tokens > CONTEXT_TOKEN_BUDGET:
+            remaining = CONTEXT_TOKEN_BUDGET - used_tokens
+            if remaining > 0:
+                context_parts.append(_tokenizer.decode(_tokenizer.encode(part)[:remaining]))
+            logger.info("Context token budget reached, truncating remaining fragments")
+            break
+
+        context_parts.append(part)
+        used_tokens += part_tokens
+
     context_str = "\n---\n".join(context_parts)
     
     sources = [
@@ -188,30 +282,43 @@ def retrieve_context(query, chat_history):
     return {"context": context_str, "sources": sources}
 
 
+# The generator chain is stateless; build it once instead of rewiring the
+# LCEL graph on every request. Context is passed as a plain input.
+_generator_chain = prompt | llm | StrOutputParser()
+
+
 def create_rag_chain():
-    def rag_chain_func(inputs):
-        retrieved_data = retrieve_context(inputs["question"], inputs.get("chat_history", []))
-        
-        generator_chain = (
-            RunnablePassthrough.assign(
-                context=lambda x: retrieved_data["context"],
-                chat_history=lambda x: x["chat_history"]
-            )
-            | prompt
-            | llm
-            | StrOutputParser()
-        )
-        
-        answer = generator_chain.invoke({
-            "question": inputs["question"],
-            "chat_history": inputs.get("chat_history", [])
-        })
-        
+    async def rag_chain_func(inputs):
+        retrieved_data = await retrieve_context(inputs["question"], inputs.get("chat_history", []))
+
+        async with _llm_semaphore:
+            answer = await _generator_chain.ainvoke({
+                "question": inputs["question"],
+                "chat_history": inputs.get("chat_history", []),
+                "context": retrieved_data["context"]
+            })
+
         return {
             "answer": answer,
             "sources": retrieved_data["sources"]
         }
-        
+
     return rag_chain_func
 
+
+async def astream_rag_chain(inputs):
+    """Yield ("token", chunk) events while the answer streams, then a final
+    ("sources", [...]) event once generation completes."""
+    retrieved_data = await retrieve_context(inputs["question"], inputs.get("chat_history", []))
+
+    async with _llm_semaphore:
+        async for chunk in _generator_chain.astream({
+            "question": inputs["question"],
+            "chat_history": inputs.get("chat_history", []),
+            "context": retrieved_data["context"]
+        }):
+            yield "token", chunk
+
+    yield "sources", retrieved_data["sources"]
+
 rag_chain = create_rag_chain()
\ No newline at end of file
@@ -6,17 +6,25 @@ load_dotenv()
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_LLM_MODEL = "gpt-4o"
+OPENAI_SUMMARY_MODEL = "gpt-4o-mini"
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", 8))
 
 QDRANT_HOST = os.getenv("QDRANT_HOST", "qdrant")
 QDRANT_PORT = int(os.getenv("QDRANT_PORT", 6333))
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", 6334))
 QDRANT_COLLECTION_NAME = "epitome_academy_content"
 
+REDIS_HOST = os.getenv("REDIS_HOST", "redis")
+REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+EMBEDDING_CACHE_TTL = int(os.getenv("EMBEDDING_CACHE_TTL", 86400))
+
 TEXT_VECTOR_NAME = "text"
 IMAGE_VECTOR_NAME = "image"
 VIDEO_VECTOR_NAME = "video"
 AUDIO_VECTOR_NAME = "audio"
 
 TEXT_EMBEDDING_MODEL = 'app/embedding_service/sentence_transformer/'
+TEXT_EMBEDDING_ONNX_MODEL = 'app/embedding_service/sentence_transformer_onnx/model_int8.onnx'
 TEXT_EMBEDDING_DIM = 384
 
 IMAGE_EMBEDDING_MODEL = 'app/embedding_service/clip/'
@@ -27,4 +35,11 @@ VIDEO_EMBEDDING_DIM = 512
 AUDIO_EMBEDDING_MODEL = 'app/embedding_service/wav2vec2/'
 AUDIO_EMBEDDING_DIM = 768
 
+WARM_MODELS_ON_STARTUP = os.getenv("WARM_MODELS_ON_STARTUP", "true").lower() == "true"
+
+# Warm-start recommendations: let Qdrant average the interaction vectors
+# server-side (recommend API) instead of pulling them over the wire and
+# averaging client-side. Flag kept for A/B fallback.
+SERVER_SIDE_RECOMMEND = os.getenv("SERVER_SIDE_RECOMMEND", "true").lower() == "true"
+
 TEMP_FILES_DIR = Path("temp_files")
\ No newline at end of file
@@ -0,0 +1,61 @@
+import hashlib
+import logging
+
+import numpy as np
+import redis
+
+from app.core.config import REDIS_HOST, REDIS_PORT, EMBEDDING_CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+_redis_client = None
+_redis_available = True
+
+
+def _get_client():
+    """Lazily connect to Redis; disable the cache for the process if it fails."""
+    global _redis_client, _redis_available
+    if not _redis_available:
+        return None
+    if _redis_client is None:
+        try:
+            _redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, socket_timeout=0.5)
+            _redis_client.ping()
+            logger.info("Connected to Redis embedding cache.")
+        except Exception as e:
+            logger.warning(f"Redis embedding cache unavailable, running without it: {e}")
+            _redis_available = False
+            _redis_client = None
+    return _redis_client
+
+
+def _cache_key(prefix, text):
+    return f"{prefix}:" + hashlib.sha256(text.strip().lower().encode()).hexdigest()
+
+
+def get_embedding(prefix, text):
+    client = _get_client()
+    if client is None:
+        return None
+    try:
+        raw = client.get(_cache_key(prefix, text))
+    except Exception as e:
+        logger.warning(f"Redis GET failed: {e}")
+        return None
+    if raw is None:
+        return None
+    return np.frombuffer(raw, dtype=np.float32).tolist()
+
+
+def set_embedding(prefix, text, embedding):
+    client = _get_client()
+    if client is None or not embedding:
+        return
+    try:
+        client.set(
+            _cache_key(prefix, text),
+            np.asarray(embedding, dtype=np.float32).tobytes(),
+            ex=EMBEDDING_CACHE_TTL,
+        )
+    except Exception as e:
+        logger.warning(f"Redis SET failed: {e}")
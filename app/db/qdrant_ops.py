@@ -1,39 +1,194 @@
-from qdrant_client import QdrantClient, models
-import uuid
+from qdrant_client import QdrantClient, AsyncQdrantClient, models
+import asyncio
+import hashlib
 import logging
+import numpy as np
+from functools import lru_cache
 
 from app.core.config import (
-    QDRANT_HOST, QDRANT_PORT, QDRANT_COLLECTION_NAME,
+    QDRANT_HOST, QDRANT_PORT, QDRANT_GRPC_PORT, QDRANT_COLLECTION_NAME,
     TEXT_EMBEDDING_DIM, IMAGE_EMBEDDING_DIM,
     AUDIO_EMBEDDING_DIM, VIDEO_EMBEDDING_DIM,
     TEXT_VECTOR_NAME, IMAGE_VECTOR_NAME, AUDIO_VECTOR_NAME, VIDEO_VECTOR_NAME
 )
 from app.models.encoders import encoder
 
+try:
+    import simsimd
+except ImportError:
+    simsimd = None
+
 logger = logging.getLogger(__name__)
-qdrant_client = QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT)
 
+# Raise the gRPC message cap so bulk point uploads and with_vectors
+# retrievals fit in one message, and keep idle channels alive instead of
+# paying a reconnect on the first request after a quiet period.
+_GRPC_OPTIONS = {
+    "grpc.max_send_message_length": 64 * 1024 * 1024,
+    "grpc.max_receive_message_length": 64 * 1024 * 1024,
+    "grpc.keepalive_time_ms": 30_000,
+    "grpc.keepalive_timeout_ms": 10_000,
+}
 
-def create_collection_if_not_exists():
+qdrant_client = QdrantClient(
+    host=QDRANT_HOST, port=QDRANT_PORT, grpc_port=QDRANT_GRPC_PORT,
+    prefer_grpc=True, grpc_options=_GRPC_OPTIONS, timeout=30,
+)
+async_qdrant_client = AsyncQdrantClient(
+    host=QDRANT_HOST, port=QDRANT_PORT, grpc_port=QDRANT_GRPC_PORT,
+    prefer_grpc=True, grpc_options=_GRPC_OPTIONS, timeout=30,
+)
+
+# Payload fields actually read by the retrieval and recommendation paths.
+# Restricting search responses to these keeps long text chunks and base64
+# blobs from being shipped back on every query.
+SEARCH_PAYLOAD_FIELDS = [
+    "doc_id", "title", "source_file", "original_filename", "filename",
+    "page_number", "type", "content_type", "category", "text",
+    "timestamp", "start_time", "end_time",
+]
+_search_payload_selector = models.PayloadSelectorInclude(include=SEARCH_PAYLOAD_FIELDS)
+
+# Rescore the int8-quantized top-k against full-precision vectors so the
+# 4x memory saving costs ~nothing in recall.
+def _make_search_params(ef = None):
+    return models.SearchParams(
+        hnsw_ef=ef or 64,
+        quantization=models.QuantizationSearchParams(ignore=False, rescore=True, oversampling=2.0),
+    )
+
+_quantized_search_params = _make_search_params()
+
+@lru_cache(maxsize=512)
+def _exclude_filter(exclude_ids):
+    """Build (and memoize) a must_not filter for a tuple of point ids.
+
+    A user's interaction history is passed on every recommendation call;
+    caching on the sorted id tuple skips re-validating the same Filter
+    model over and over.
+    """
+    return models.Filter(
+        must_not=[models.HasIdCondition(has_id=list(exclude_ids))]
+    )
+
+
+@lru_cache(maxsize=4096)
+def _interacted_filter(user_id):
+    """must_not condition on the indexed interacted_by payload field.
+
+    Stays O(1) in size however long the user's history grows, unlike a
+    HasIdCondition carrying every seen point id.
+    """
+    return models.Filter(
+        must_not=[models.FieldCondition(key="interacted_by", match=models.MatchValue(value=user_id))]
+    )
+
+
+def mark_points_interacted(user_id, point_ids):
+    """Append user_id to the interacted_by payload list of the given points."""
+    if not point_ids:
+        return
     try:
-        qdrant_client.get_collection(collection_name=QDRANT_COLLECTION_NAME)
+        existing = qdrant_client.retrieve(
+            collection_name=QDRANT_COLLECTION_NAME,
+            ids=list(point_ids),
+            with_payload=["interacted_by"],
+            with_vectors=False,
+        )
+        for point in existing:
+            seen_by = (point.payload or {}).get("interacted_by") or []
+            if user_id in seen_by:
+                continue
+            qdrant_client.set_payload(
+                collection_name=QDRANT_COLLECTION_NAME,
+                payload={"interacted_by": seen_by + [user_id]},
+                points=[point.id],
+                wait=False,
+            )
+    except Exception as e:
+        logger.error(f"Failed to mark points interacted for user '{user_id}': {e}")
+
+
+def _as_query_vector(vector):
+    """Pass ndarrays straight through to the gRPC client as float32 instead
+    of boxing every dimension into a Python float with .tolist()."""
+    if isinstance(vector, np.ndarray):
+        return vector.astype(np.float32, copy=False)
+    return vector
+
+
+def create_collection_if_not_exists():
+    if qdrant_client.collection_exists(collection_name=QDRANT_COLLECTION_NAME):
         logger.info(f"Collection '{QDRANT_COLLECTION_NAME}' already exists.")
-    except Exception:
+    else:
         logger.info(f"Collection '{QDRANT_COLLECTION_NAME}' not found. Creating...")
-        qdrant_client.recreate_collection(
+        qdrant_client.create_collection(
             collection_name=QDRANT_COLLECTION_NAME,
             vectors_config={
-                TEXT_VECTOR_NAME: models.VectorParams(size=TEXT_EMBEDDING_DIM, distance=models.Distance.COSINE),
-                IMAGE_VECTOR_NAME: models.VectorParams(size=IMAGE_EMBEDDING_DIM, distance=models.Distance.COSINE),
-                VIDEO_VECTOR_NAME: models.VectorParams(size=VIDEO_EMBEDDING_DIM, distance=models.Distance.COSINE),
-                AUDIO_VECTOR_NAME: models.VectorParams(size=AUDIO_EMBEDDING_DIM, distance=models.Distance.COSINE),
+                # Vectors are L2-normalized at encode time, so dot product
+                # ranks identically to cosine with one fewer norm per candidate.
+                # Denser graphs (m=32) for the heavily queried text/image
+                # spaces; sparser (m=12) for the coarse video/audio vectors
+                # where one point represents a whole file.
+                TEXT_VECTOR_NAME: models.VectorParams(
+                    size=TEXT_EMBEDDING_DIM, distance=models.Distance.DOT,
+                    hnsw_config=models.HnswConfigDiff(m=32, ef_construct=128)),
+                IMAGE_VECTOR_NAME: models.VectorParams(
+                    size=IMAGE_EMBEDDING_DIM, distance=models.Distance.DOT,
+                    hnsw_config=models.HnswConfigDiff(m=32, ef_construct=128)),
+                VIDEO_VECTOR_NAME: models.VectorParams(
+                    size=VIDEO_EMBEDDING_DIM, distance=models.Distance.DOT,
+                    hnsw_config=models.HnswConfigDiff(m=12, ef_construct=128)),
+                AUDIO_VECTOR_NAME: models.VectorParams(
+                    size=AUDIO_EMBEDDING_DIM, distance=models.Distance.DOT,
+                    hnsw_config=models.HnswConfigDiff(m=12, ef_construct=128)),
             },
+            quantization_config=models.ScalarQuantization(
+                scalar=models.ScalarQuantizationConfig(
+                    type=models.ScalarType.INT8,
+                    quantile=0.99,
+                    always_ram=True,
+                )
+            ),
+            hnsw_config=models.HnswConfigDiff(on_disk=True),
         )
         logger.info("Collection created successfully.")
 
+    # Keyword index for the per-point list of users who interacted with
+    # it; lets recommendation queries exclude seen content with one
+    # indexed condition instead of a must_not over the whole history.
+    qdrant_client.create_payload_index(
+        collection_name=QDRANT_COLLECTION_NAME,
+        field_name="interacted_by",
+        field_schema=models.PayloadSchemaType.KEYWORD,
+    )
+
 
-def upsert_chunk(doc_id, chunk_metadata, text_chunk = None, image_chunk_bytes = None):
-    point_id = str(uuid.uuid4())
+def _vector_as_list(embedding):
+    """Convert an ndarray embedding to a plain list at the last moment.
+
+    Batch encoders hand back contiguous float32 rows; the boxing into
+    Python floats happens only here, at the serialization boundary.
+    """
+    return embedding.tolist() if isinstance(embedding, np.ndarray) else embedding
+
+
+def _content_point_id(*parts):
+    """Deterministic unsigned int64 point id hashed from chunk identity.
+
+    Integer ids serialize much smaller on the wire than hyphenated UUID
+    strings, and deriving them from the chunk's content means re-ingesting
+    an unchanged file upserts over its existing points instead of piling
+    up duplicates under fresh random ids.
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode())
+    return int.from_bytes(digest.digest(), "big")
+
+
+def build_point(doc_id, chunk_metadata, text_chunk = None, image_chunk_bytes = None):
+    """Encode a chunk and construct its PointStruct without touching Qdrant."""
     vectors = {}
     payload = {"doc_id": doc_id, **chunk_metadata}
 
@@ -52,19 +207,150 @@ def upsert_chunk(doc_id, chunk_metadata, text_chunk = None, image_chunk_bytes =
             payload['type'] = 'image'
 
     if not vectors:
-        logger.warning(f"Skipping upsert for doc_id {doc_id} as no vector was generated.")
+        logger.warning(f"Skipping chunk for doc_id {doc_id} as no vector was generated.")
+        return None
+
+    # original_filename is the user-facing name and stable across
+    # uploads; source_file is the per-upload temp filename and would
+    # give every re-ingest fresh ids.
+    point_id = _content_point_id(
+        chunk_metadata.get('original_filename', ''),
+        chunk_metadata.get('page_number', ''),
+        text_to_encode or b'',
+        image_chunk_bytes or b'',
+    )
+    return models.PointStruct(id=point_id, vector=vectors, payload=payload)
+
+
+def upsert_chunk(doc_id, chunk_metadata, text_chunk = None, image_chunk_bytes = None):
+    point = build_point(doc_id, chunk_metadata, text_chunk=text_chunk, image_chunk_bytes=image_chunk_bytes)
+    if point is None:
         return
 
     qdrant_client.upsert(
         collection_name=QDRANT_COLLECTION_NAME,
-        points=[models.PointStruct(id=point_id, vector=vectors, payload=payload)],
+        points=[point],
         wait=False
     )
-    logger.debug(f"Upserted chunk for doc_id {doc_id} with point_id {point_id}")
+    logger.debug(f"Upserted chunk for doc_id {doc_id} with point_id {point.id}")
+
+
+def upload_points_bulk(points, batch_size = 128, parallel = 4):
+    """Upload many points with parallel batched writers.
+
+    HNSW indexing is suspended for the duration of the bulk write and
+    re-enabled afterwards, as recommended for bulk ingestion.
+    """
+    if not points:
+        return
+    try:
+        qdrant_client.update_collection(
+            collection_name=QDRANT_COLLECTION_NAME,
+            optimizer_config=models.OptimizersConfigDiff(indexing_threshold=0),
+        )
+        qdrant_client.upload_points(
+            collection_name=QDRANT_COLLECTION_NAME,
+            points=points,
+            batch_size=batch_size,
+            parallel=parallel,
+            wait=False,
+        )
+    finally:
+        qdrant_client.update_collection(
+            collection_name=QDRANT_COLLECTION_NAME,
+            optimizer_config=models.OptimizersConfigDiff(indexing_threshold=20_000),
+        )
+
+
+async def aupsert_chunks_batch(doc_id, text_items = None, image_items = None):
+    """Batch-encode a document's chunks and upsert them in bulk.
+
+    text_items and image_items are lists of (content, metadata) tuples,
+    as produced by the PDF processor. Encoding runs in a worker thread so
+    the event loop stays responsive, and the points are written through
+    aupload_points_bulk.
+    """
+    points = []
+
+    if text_items:
+        texts = []
+        metadatas = []
+        for content, metadata in text_items:
+            text = content.get('text') if isinstance(content, dict) else content
+            if text and isinstance(text, str) and text.strip():
+                texts.append(text)
+                metadatas.append(metadata)
+
+        if texts:
+            embeddings = await asyncio.to_thread(encoder.encode_texts, texts)
+            for text, metadata, embedding in zip(texts, metadatas, embeddings):
+                payload = {"doc_id": doc_id, **metadata, 'text': text}
+                points.append(models.PointStruct(
+                    id=_content_point_id(metadata.get('original_filename', ''), metadata.get('page_number', ''), text),
+                    vector={TEXT_VECTOR_NAME: _vector_as_list(embedding)},
+                    payload=payload
+                ))
+
+    if image_items:
+        embeddings = await asyncio.to_thread(encoder.encode_images, [content for content, _ in image_items])
+        for (content, metadata), embedding in zip(image_items, embeddings):
+            if embedding is not None:
+                payload = {"doc_id": doc_id, **metadata, 'type': 'image'}
+                points.append(models.PointStruct(
+                    id=_content_point_id(metadata.get('original_filename', ''), metadata.get('page_number', ''), content),
+                    vector={IMAGE_VECTOR_NAME: _vector_as_list(embedding)},
+                    payload=payload
+                ))
+
+    if not points:
+        logger.warning(f"Skipping batch upsert for doc_id {doc_id} as no vectors were generated.")
+        return
+
+    await aupload_points_bulk(points)
+    logger.info(f"Upserted {len(points)} chunks for doc_id {doc_id}")
+
+
+async def aupload_points_bulk(points, batch_size = 128, max_concurrency = 8):
+    """Upload many points as concurrent batched upserts on the async client.
+
+    The workload is network-latency-bound, so overlapping batches hides
+    the round-trips; the semaphore caps in-flight requests so we do not
+    overwhelm the server. Indexing is suspended for the duration, as in
+    upload_points_bulk.
+    """
+    if not points:
+        return
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _upsert_batch(batch):
+        async with semaphore:
+            await async_qdrant_client.upsert(
+                collection_name=QDRANT_COLLECTION_NAME,
+                points=batch,
+                wait=False,
+            )
+
+    try:
+        await async_qdrant_client.update_collection(
+            collection_name=QDRANT_COLLECTION_NAME,
+            optimizer_config=models.OptimizersConfigDiff(indexing_threshold=0),
+        )
+        await asyncio.gather(*[
+            _upsert_batch(points[start:start + batch_size])
+            for start in range(0, len(points), batch_size)
+        ])
+    finally:
+        await async_qdrant_client.update_collection(
+            collection_name=QDRANT_COLLECTION_NAME,
+            optimizer_config=models.OptimizersConfigDiff(indexing_threshold=20_000),
+        )
 
 
 def upsert_video_audio_embeddings(doc_id, metadata, video_vector, audio_vector = None):
-    point_id = str(uuid.uuid4())
+    # One point per video file: keyed on the filename so re-ingesting the
+    # same video replaces its embeddings.
+    point_id = _content_point_id(metadata.get('original_filename', doc_id), 'video_audio')
     payload = {"doc_id": doc_id, **metadata}
 
     vectors = {VIDEO_VECTOR_NAME: video_vector}
@@ -79,40 +365,76 @@ def upsert_video_audio_embeddings(doc_id, metadata, video_vector, audio_vector =
     logger.info(f"Video/audio embeddings upserted for doc_id {doc_id}")
 
 
+def rerank_local(query, candidates, top_k = 10):
+    """Rank a small in-memory candidate set against a query vector locally.
+
+    For a handful of vectors already in hand (e.g. a user's interacted
+    points) a brute-force cosine pass beats a Qdrant round-trip. Uses
+    SimSIMD's vectorized cdist when available, otherwise a NumPy matmul
+    (embeddings are L2-normalized, so dot product equals cosine).
+
+    Returns the indices of the top_k candidates, best first.
+    """
+    if not len(candidates):
+        return []
+
+    query_vector = np.asarray(query, dtype=np.float32)
+    matrix = np.stack([np.asarray(candidate, dtype=np.float32) for candidate in candidates])
+
+    if simsimd is not None:
+        # cosine *distance*: lower is more similar.
+        distances = np.asarray(simsimd.cdist(query_vector[None, :], matrix, metric="cosine"))[0]
+        order = np.argsort(distances)
+    else:
+        order = np.argsort(matrix @ query_vector)[::-1]
+
+    return order[:top_k].tolist()
+
+
+# The modalities the user-profile paths aggregate; image vectors are
+# never part of a profile so there is no reason to ship them back.
+_PROFILE_VECTOR_NAMES = [TEXT_VECTOR_NAME, VIDEO_VECTOR_NAME, AUDIO_VECTOR_NAME]
+
 def get_points_by_ids(point_ids):
+    """Retrieve only the profile-relevant named vectors for the given ids.
+
+    Every caller aggregates vectors and ignores payloads, so payloads
+    (which can hold whole text chunks) stay server-side.
+    """
     if not point_ids:
         return []
     try:
-        records, _ = qdrant_client.scroll(
+        points = qdrant_client.retrieve(
             collection_name=QDRANT_COLLECTION_NAME,
-            scroll_filter=models.Filter(
-                must=[models.HasIdCondition(has_id=point_ids)]
-            ),
-            limit=len(point_ids),
-            with_vectors=True,
-            with_payload=True
+            ids=point_ids,
+            with_vectors=_PROFILE_VECTOR_NAMES,
+            with_payload=False
         )
-        return records
     except Exception as e:
         logger.error(f"Failed to retrieve points by IDs: {e}")
         return []
 
-def search_similar_content(vector, vector_name, limit = 10, exclude_ids = None):
-    search_filter = None
-    if exclude_ids:
-        search_filter = models.Filter(
-            must_not=[models.HasIdCondition(has_id=exclude_ids)]
-        )
+    # Normalize here so consumers can loop over named vectors without
+    # re-checking the shape per point: a bare list (unnamed single
+    # vector) becomes a text-named dict, a missing vector an empty one.
+    for point in points:
+        if isinstance(point.vector, list):
+            point.vector = {TEXT_VECTOR_NAME: point.vector}
+        elif point.vector is None:
+            point.vector = {}
+    return points
+
+def search_similar_content(vector, vector_name, limit = 10, exclude_ids = None, ef = None):
+    search_filter = _exclude_filter(tuple(sorted(exclude_ids))) if exclude_ids else None
 
     try:
-        vector_list = vector.tolist() if hasattr(vector, 'tolist') else vector
-            
         hits = qdrant_client.search(
             collection_name=QDRANT_COLLECTION_NAME,
-            query_vector=(vector_name, vector_list),
+            query_vector=(vector_name, _as_query_vector(vector)),
             query_filter=search_filter,
             limit=limit,
-            with_payload=True,
+            with_payload=_search_payload_selector,
+            search_params=_quantized_search_params if ef is None else _make_search_params(ef),
         )
         return hits
     except Exception as e:
@@ -120,74 +442,190 @@ def search_similar_content(vector, vector_name, limit = 10, exclude_ids = None):
         return []
 
 
-def insert_temporary_point(point_id, vector, vector_name, payload):
+async def asearch_similar_content(vector, vector_name, limit = 10, exclude_ids = None, ef = None):
+    search_filter = _exclude_filter(tuple(sorted(exclude_ids))) if exclude_ids else None
+
     try:
-        if hasattr(vector, 'tolist'):
-            vector_list = vector.tolist()
-        else:
-            vector_list = vector
-            
-        qdrant_client.upsert(
-            collection_name=QDRANT_COLLECTION_NAME,
-            points=[models.PointStruct(id=point_id, vector={vector_name: vector_list}, payload=payload)],
-            wait=True 
-        )
-        logger.debug(f"Temporary point {point_id} inserted for keyword search")
-        return True
+        hits = await async_qdrant_client.search(
+            collection_name=QDRANT_COLLECTION_NAME,
+            query_vector=(vector_name, _as_query_vector(vector)),
+            query_filter=search_filter,
+            limit=limit,
+            with_payload=_search_payload_selector,
+            search_params=_quantized_search_params if ef is None else _make_search_params(ef),
+        )
+        return hits
     except Exception as e:
-        logger.error(f"Failed to insert temporary point {point_id}: {e}")
-        return False
+        logger.error(f"Error during Qdrant search for vector '{vector_name}': {e}")
+        return []
 
 
-def delete_point(point_id):
+async def asearch_batch_content(search_specs, exclude_ids = None, exclude_user = None):
+    """Run several named-vector searches in one Qdrant round-trip.
+
+    search_specs is a list of (vector_name, vector, limit) tuples; the
+    optional exclusion (by user via the indexed interacted_by field, or
+    by explicit point ids) is applied to every request. Results are
+    returned in the same order.
+    """
+    if exclude_user:
+        search_filter = _interacted_filter(exclude_user)
+    elif exclude_ids:
+        search_filter = _exclude_filter(tuple(sorted(exclude_ids)))
+    else:
+        search_filter = None
+
+    requests = []
+    for vector_name, vector, limit in search_specs:
+        vector_list = vector.tolist() if hasattr(vector, 'tolist') else vector
+        requests.append(models.SearchRequest(
+            vector=models.NamedVector(name=vector_name, vector=vector_list),
+            filter=search_filter,
+            limit=limit,
+            with_payload=_search_payload_selector,
+            params=_quantized_search_params,
+        ))
+
     try:
-        qdrant_client.delete(
+        return await async_qdrant_client.search_batch(
             collection_name=QDRANT_COLLECTION_NAME,
-            points_selector=models.PointIdsList(
-                points=[point_id]
-            )
+            requests=requests,
+        )
+    except Exception as e:
+        logger.error(f"Error during Qdrant batch search: {e}")
+        return [[] for _ in search_specs]
+
+
+async def aquery_fused_content(prefetch_specs, limit = 6):
+    """Fuse several named-vector searches server-side with Reciprocal Rank
+    Fusion in one query_points round-trip.
+
+    prefetch_specs is a list of (vector_name, vector, prefetch_limit) tuples.
+    """
+    prefetch = []
+    for vector_name, vector, prefetch_limit in prefetch_specs:
+        vector_list = vector.tolist() if hasattr(vector, 'tolist') else vector
+        prefetch.append(models.Prefetch(
+            query=vector_list,
+            using=vector_name,
+            limit=prefetch_limit,
+            params=_quantized_search_params,
+        ))
+
+    try:
+        response = await async_qdrant_client.query_points(
+            collection_name=QDRANT_COLLECTION_NAME,
+            prefetch=prefetch,
+            query=models.FusionQuery(fusion=models.Fusion.RRF),
+            limit=limit,
+            with_payload=_search_payload_selector,
         )
-        logger.debug(f"Point {point_id} deleted from Qdrant")
-        return True
+        return response.points
     except Exception as e:
-        logger.error(f"Failed to delete point {point_id}: {e}")
-        return False
-
-def search_similar_to_point(point_id, vector_name, limit = 10, exclude_ids = None):
-    exclude_list = [point_id]
-    if exclude_ids:
-        exclude_list.extend(exclude_ids)
-    
-    search_filter = models.Filter(
-        must_not=[models.HasIdCondition(has_id=exclude_list)]
+        logger.error(f"Error during Qdrant fusion query: {e}")
+        return []
+
+
+async def aupsert_chunk(doc_id, chunk_metadata, text_chunk = None, image_chunk_bytes = None):
+    point = build_point(doc_id, chunk_metadata, text_chunk=text_chunk, image_chunk_bytes=image_chunk_bytes)
+    if point is None:
+        return
+
+    await async_qdrant_client.upsert(
+        collection_name=QDRANT_COLLECTION_NAME,
+        points=[point],
+        wait=False
     )
+    logger.debug(f"Upserted chunk for doc_id {doc_id} with point_id {point.id}")
 
+
+async def aget_points_by_ids(point_ids):
+    if not point_ids:
+        return []
     try:
-        points = qdrant_client.retrieve(
+        return await async_qdrant_client.retrieve(
             collection_name=QDRANT_COLLECTION_NAME,
-            ids=[point_id],
-            with_vectors=True
-        )
-        
-        if not points:
-            logger.error(f"Point {point_id} not found in Qdrant")
-            return []
-        
-        point = points[0]
-        if vector_name not in point.vector:
-            logger.error(f"Vector '{vector_name}' not found in point {point_id}")
-            return []
-        
-        vector = point.vector[vector_name]
-        
-        hits = qdrant_client.search(
+            ids=point_ids,
+            with_vectors=True,
+            with_payload=True
+        )
+    except Exception as e:
+        logger.error(f"Failed to retrieve points by IDs: {e}")
+        return []
+
+
+def recommend_similar_content(positive_ids, vector_name, limit = 10, exclude_ids = None):
+    """Server-side recommendation from a set of liked/seen points.
+
+    Qdrant averages the stored vectors of positive_ids itself, so the
+    raw float vectors never cross the wire and the seeds are excluded
+    from results automatically.
+    """
+    search_filter = _exclude_filter(tuple(sorted(exclude_ids))) if exclude_ids else None
+
+    try:
+        return qdrant_client.recommend(
             collection_name=QDRANT_COLLECTION_NAME,
-            query_vector=(vector_name, vector),
+            positive=positive_ids,
+            using=vector_name,
             query_filter=search_filter,
             limit=limit,
-            with_payload=True,
+            with_payload=_search_payload_selector,
+            search_params=_quantized_search_params,
+        )
+    except Exception as e:
+        logger.error(f"Error during Qdrant recommend on vector '{vector_name}': {e}")
+        return []
+
+
+def recommend_batch_content(space_positives, limit = 10):
+    """One recommend per vector space, bundled into a single round-trip.
+
+    space_positives is a list of (vector_name, positive_ids) pairs — each
+    space gets only seed points that actually carry that named vector,
+    since Qdrant rejects positives missing the `using` vector. Results
+    come back as a list of hit lists in the same order, so a
+    multi-modality recommendation pays one RPC instead of one per space.
+    """
+    requests = [
+        models.RecommendRequest(
+            positive=list(positive_ids),
+            using=vector_name,
+            limit=limit,
+            with_payload=_search_payload_selector,
+            params=_quantized_search_params,
+        )
+        for vector_name, positive_ids in space_positives
+    ]
+
+    try:
+        return qdrant_client.recommend_batch(
+            collection_name=QDRANT_COLLECTION_NAME,
+            requests=requests,
+        )
+    except Exception as e:
+        logger.error(f"Error during Qdrant batch recommend: {e}")
+        return [[] for _ in requests]
+
+
+async def arecommend_batch_content(space_positives, limit = 10):
+    """Async counterpart of recommend_batch_content."""
+    requests = [
+        models.RecommendRequest(
+            positive=list(positive_ids),
+            using=vector_name,
+            limit=limit,
+            with_payload=_search_payload_selector,
+            params=_quantized_search_params,
+        )
+        for vector_name, positive_ids in space_positives
+    ]
+
+    try:
+        return await async_qdrant_client.recommend_batch(
+            collection_name=QDRANT_COLLECTION_NAME,
+            requests=requests,
         )
-        return hits
     except Exception as e:
-        logger.error(f"Error during Qdrant search for point '{point_id}': {e}")
-        return []
\ No newline at end of file
+        logger.error(f"Error during Qdrant batch recommend: {e}")
+        return [[] for _ in requests]
@@ -0,0 +1,36 @@
+"""One-time export of the sentence-transformer to int8 ONNX.
+
+Produces app/embedding_service/sentence_transformer_onnx/model_int8.onnx,
+which MultimodalEncoder picks up automatically at startup. Requires
+`pip install optimum[exporters] onnxruntime`.
+
+Usage: python -m app.embedding_service.export_onnx
+"""
+import subprocess
+from pathlib import Path
+
+from onnxruntime.quantization import QuantType, quantize_dynamic
+
+from app.core.config import TEXT_EMBEDDING_MODEL, TEXT_EMBEDDING_ONNX_MODEL
+
+ONNX_DIR = Path(TEXT_EMBEDDING_ONNX_MODEL).parent
+
+
+def main():
+    ONNX_DIR.mkdir(parents=True, exist_ok=True)
+    subprocess.run([
+        "optimum-cli", "export", "onnx",
+        "--model", TEXT_EMBEDDING_MODEL,
+        "--task", "feature-extraction",
+        str(ONNX_DIR),
+    ], check=True)
+    quantize_dynamic(
+        str(ONNX_DIR / "model.onnx"),
+        TEXT_EMBEDDING_ONNX_MODEL,
+        weight_type=QuantType.QInt8,
+    )
+    print(f"Quantized model written to {TEXT_EMBEDDING_ONNX_MODEL}")
+
+
+if __name__ == "__main__":
+    main()
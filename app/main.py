@@ -1,19 +1,22 @@
 import os
 import shutil
 import uuid
+import asyncio
 import logging
 import json
+import aiofiles
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException, BackgroundTasks, Depends, Body
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi import APIRouter
 from pathlib import Path
 from typing import List, Optional
 
-from app.processing.video_processor import extract_frames, extract_audio
+from app.processing.video_processor import sample_video_frames, extract_audio
 from app.models.encoders import encoder
 from app.db.qdrant_ops import upsert_video_audio_embeddings
-from app.core.config import TEMP_FILES_DIR
-from app.db.qdrant_ops import create_collection_if_not_exists, qdrant_client, upsert_chunk
+from app.core.config import TEMP_FILES_DIR, WARM_MODELS_ON_STARTUP
+from app.db.qdrant_ops import create_collection_if_not_exists, qdrant_client, aupsert_chunks_batch
 from app.processing.document_processor import process_pdf
 from app.recommendation import user_service, recommender
 from app.models import schemas
@@ -28,6 +31,7 @@ app = FastAPI(
     title="Epitome Academy - AI",
     description="API for content processing, recommendation, and AI chatbot at Epitome Academy.",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
 )
 
 app.add_middleware(
@@ -38,31 +42,59 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Write-behind queue for interaction events: the endpoint enqueues and
+# returns immediately; a background coroutine drains in batches. Like/view
+# durability is low-priority, latency is not.
+_interaction_queue: asyncio.Queue = asyncio.Queue(maxsize=10_000)
+_interaction_drain_task = None
+
+async def _drain_interactions():
+    while True:
+        batch = [await _interaction_queue.get()]
+        while len(batch) < 256:
+            try:
+                batch.append(_interaction_queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        try:
+            # record_interactions now also folds new vectors into the
+            # running profile sums (a Qdrant retrieve), so keep it off
+            # the event loop.
+            await asyncio.to_thread(user_service.record_interactions, batch)
+        except Exception as e:
+            logger.error(f"Failed to record interaction batch: {e}")
+        for _ in batch:
+            _interaction_queue.task_done()
+        await asyncio.sleep(0.1)
+
 @app.on_event("startup")
 def startup_event():
+    global _interaction_drain_task
     logger.info("Application startup...")
+    Path(TEMP_FILES_DIR).mkdir(parents=True, exist_ok=True)
     create_collection_if_not_exists()
+    if WARM_MODELS_ON_STARTUP:
+        encoder.warmup()
+    _interaction_drain_task = asyncio.get_event_loop().create_task(_drain_interactions())
     logger.info("Application startup complete.")
 
-def process_and_embed_pdf(temp_path, doc_id, original_filename, course_metadata):
+async def process_and_embed_pdf(temp_path, doc_id, original_filename, course_metadata):
     logger.info(f"BG Task: Starting PDF processing for doc_id: {doc_id}")
     try:
-        extracted_elements = process_pdf(temp_path)
-        for element in extracted_elements:
-            final_metadata = {
-                **course_metadata, 
-                **element['metadata'], 
+        chunks = await asyncio.to_thread(process_pdf, temp_path)
+
+        def _finalize(metadata):
+            return {
+                **course_metadata,
+                **metadata,
                 'original_filename': original_filename,
                 'content_type': 'document'
             }
-            
-            content = element['content']
-            element_type = element['type']
-            
-            if element_type in ['text', 'table']:
-                upsert_chunk(doc_id=doc_id, text_chunk=content, chunk_metadata=final_metadata)
-            elif element_type == 'image':
-                upsert_chunk(doc_id=doc_id, image_chunk_bytes=content, chunk_metadata=final_metadata)
+
+        text_items = [(content, _finalize(metadata)) for content, metadata in zip(chunks.texts, chunks.text_meta)]
+        image_items = [(content, _finalize(metadata)) for content, metadata in zip(chunks.images, chunks.image_meta)]
+
+        await aupsert_chunks_batch(doc_id=doc_id, text_items=text_items, image_items=image_items)
 
         logger.info(f"BG Task: Successfully processed PDF for doc_id: {doc_id}")
     except Exception as e:
@@ -71,7 +103,7 @@ def process_and_embed_pdf(temp_path, doc_id, original_filename, course_metadata)
         os.remove(temp_path)
         logger.info(f"BG Task: Cleaned up temp PDF: {temp_path}")
 
-def process_and_embed_video(temp_path, original_filename, doc_id, course_metadata):
+async def process_and_embed_video(temp_path, original_filename, doc_id, course_metadata):
     temp_folder = Path(TEMP_FILES_DIR) / Path(temp_path).stem
     try:
         logger.info(f"BG Task: Starting video processing for {original_filename}")
@@ -80,16 +112,20 @@ def process_and_embed_video(temp_path, original_filename, doc_id, course_metadat
             'original_filename': original_filename,
             'content_type': 'video'
         }
-        
-        frames = extract_frames(temp_path, str(temp_folder / "frames"))
-        wav_path = extract_audio(temp_path, str(temp_folder / "audio.wav"))
 
-        if not frames:
+        # The two ffmpeg invocations are independent; overlap them and keep
+        # the CPU/GPU-heavy encoding off the event loop.
+        frames, wav_path = await asyncio.gather(
+            asyncio.to_thread(sample_video_frames, temp_path),
+            asyncio.to_thread(extract_audio, temp_path, str(temp_folder / "audio.wav"))
+        )
+
+        if frames is None:
             logger.error(f"BG Task: No frames extracted from {original_filename}")
             return
 
-        v_emb = encoder.encode_video_from_frames(frames)
-        a_emb = encoder.encode_audio(wav_path) if wav_path else None
+        v_emb = await asyncio.to_thread(encoder.encode_video_from_frames, frames)
+        a_emb = await asyncio.to_thread(encoder.encode_audio, wav_path) if wav_path else None
 
         upsert_video_audio_embeddings(
             doc_id=doc_id,
@@ -109,6 +145,43 @@ def process_and_embed_video(temp_path, original_filename, doc_id, course_metadat
         except Exception as e:
             logger.warning(f"BG Task: Failed to clean up temp files for {original_filename}: {e}")
 
+def _sendfile_copy(src_file, dest_path):
+    """Kernel-space copy of a disk-backed upload via os.sendfile."""
+    src_file.flush()
+    src_fd = src_file.fileno()
+    dst_fd = os.open(dest_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        offset = 0
+        while True:
+            sent = os.sendfile(dst_fd, src_fd, offset, 1 << 20)
+            if sent == 0:
+                break
+            offset += sent
+    finally:
+        os.close(dst_fd)
+
+
+async def _save_upload(upload, dest_path):
+    """Persist an UploadFile to dest_path atomically.
+
+    Large uploads spool to a real temp file (>1 MB); those are copied
+    zero-copy in the kernel with os.sendfile from a worker thread. Small
+    in-memory spools stream through aiofiles. Either way the data lands
+    in a .part file first and is renamed into place so background tasks
+    never see a partial write.
+    """
+    part_path = f"{dest_path}.part"
+
+    if getattr(upload.file, "_rolled", False) and hasattr(upload.file, "fileno"):
+        await asyncio.to_thread(_sendfile_copy, upload.file, part_path)
+    else:
+        async with aiofiles.open(part_path, "wb") as buffer:
+            while chunk := await upload.read(1 << 20):
+                await buffer.write(chunk)
+
+    os.replace(part_path, dest_path)
+
+
 def get_course_metadata(metadata_str = Form(...)) -> schemas.CourseMetadata:
     try:
         metadata_dict = json.loads(metadata_str)
@@ -117,9 +190,9 @@ def get_course_metadata(metadata_str = Form(...)) -> schemas.CourseMetadata:
         raise HTTPException(status_code=400, detail="Invalid metadata format. Must be a valid JSON string.")
 
 @app.post("/ai/recommendations", response_model=List[schemas.RecommendationResponse], tags=["Recommendations"])
-def get_recommendations(request: schemas.RecommendationRequest):
+async def get_recommendations(request: schemas.RecommendationRequest):
     interaction_history = user_service.get_user_interactions(request.user_id)
-    recommendations = recommender.get_recommendations_for_user(
+    recommendations = await recommender.get_recommendations_for_user(
         user_id=request.user_id,
         interaction_history=interaction_history,
         limit=request.limit
@@ -127,10 +200,10 @@ def get_recommendations(request: schemas.RecommendationRequest):
     return recommendations
 
 @app.post("/ai/recommendations/keywords", response_model=List[schemas.KeywordsRecommendationResponse], tags=["Recommendations"])
-def get_recommendations_by_keywords(request: schemas.KeywordsRecommendationRequest):
+async def get_recommendations_by_keywords(request: schemas.KeywordsRecommendationRequest):
     if not request.keywords:
         raise HTTPException(status_code=400, detail="At least one keyword must be provided.")
-    return recommender.get_recommendations_for_keywords(
+    return await recommender.get_recommendations_for_keywords(
         keywords=request.keywords,
         per_keyword_limit=request.per_keyword_limit,
         final_limit=request.final_limit
@@ -149,11 +222,13 @@ def set_user_preferences(user_id: str, preferences: schemas.UserPreferences):
     raise HTTPException(status_code=500, detail="Failed to save preferences.")
 
 @app.post("/ai/user/interact", status_code=200, tags=["User Management"])
-def record_user_interaction(interaction: schemas.UserInteraction):
-    success = user_service.record_interaction(interaction.user_id, interaction.point_id)
-    if success:
-        return {"message": "Interaction recorded successfully."}
-    raise HTTPException(status_code=500, detail="Failed to record interaction.")
+async def record_user_interaction(interaction: schemas.UserInteraction):
+    try:
+        _interaction_queue.put_nowait(interaction)
+    except asyncio.QueueFull:
+        # Backpressure: block until the drain task catches up.
+        await _interaction_queue.put(interaction)
+    return {"message": "Interaction recorded successfully."}
 
 @app.post("/ai/upload/course", status_code=202, tags=["Content Ingestion"])
 async def upload_course(
@@ -175,15 +250,10 @@ async def upload_course(
                 logger.warning(f"Invalid file type skipped: {doc_file.filename}")
                 continue
 
-            os.makedirs(TEMP_FILES_DIR, exist_ok=True)
             temp_path = TEMP_FILES_DIR / f"{uuid.uuid4()}-{doc_file.filename}"
 
-            try:
-                with open(temp_path, "wb") as buffer:
-                    shutil.copyfileobj(doc_file.file, buffer)
-            finally:
-                doc_file.file.close()
-            
+            await _save_upload(doc_file, temp_path)
+
             background_tasks.add_task(process_and_embed_pdf, str(temp_path), doc_id, doc_file.filename, base_metadata)
 
     if video:
@@ -191,14 +261,9 @@ async def upload_course(
         if not video.filename.lower().endswith(valid_ext):
             raise HTTPException(status_code=400, detail=f"Invalid video file type: {video.filename}")
 
-        os.makedirs(TEMP_FILES_DIR, exist_ok=True)
         temp_path = TEMP_FILES_DIR / f"{uuid.uuid4()}-{video.filename}"
 
-        try:
-            with open(temp_path, "wb") as buffer:
-                shutil.copyfileobj(video.file, buffer)
-        finally:
-            video.file.close()
+        await _save_upload(video, temp_path)
 
         background_tasks.add_task(process_and_embed_video, str(temp_path), video.filename, doc_id, base_metadata)
 
@@ -216,14 +281,14 @@ def health_check():
 chat_router = APIRouter(prefix="/ai/chat", tags=["AI Chatbot"])
 
 @chat_router.post("/ask", response_model=schemas.AskResponse)
-def ask_question(request: schemas.AskRequest):
+async def ask_question(request: schemas.AskRequest):
     if not OPENAI_API_KEY:
         raise HTTPException(status_code=500, detail="OpenAI API key is not configured.")
 
     conv_id = history.get_or_create_conversation_id(request.conversation_id)
     chat_history = history.get_history(conv_id)
-    
-    result = rag_pipeline.rag_chain({
+
+    result = await rag_pipeline.rag_chain({
         "question": request.question,
         "chat_history": chat_history
     })
@@ -236,6 +301,30 @@ def ask_question(request: schemas.AskRequest):
         sources=result["sources"]
     )
 
+@chat_router.post("/ask/stream")
+async def ask_question_stream(request: schemas.AskRequest):
+    if not OPENAI_API_KEY:
+        raise HTTPException(status_code=500, detail="OpenAI API key is not configured.")
+
+    conv_id = history.get_or_create_conversation_id(request.conversation_id)
+    chat_history = history.get_history(conv_id)
+
+    async def event_stream():
+        answer_parts = []
+        async for event, data in rag_pipeline.astream_rag_chain({
+            "question": request.question,
+            "chat_history": chat_history
+        }):
+            if event == "token":
+                answer_parts.append(data)
+                yield f"data: {json.dumps({'token': data})}\n\n"
+            else:
+                sources = [source.model_dump() for source in data]
+                yield f"data: {json.dumps({'conversation_id': conv_id, 'sources': sources})}\n\n"
+        history.update_history(conv_id, request.question, "".join(answer_parts))
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
 @chat_router.get("/{conversation_id}/history", tags=["AI Chatbot"])
 def get_conversation_history(conversation_id: str):
     chat_history = history.get_history(conversation_id)
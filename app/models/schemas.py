@@ -26,7 +26,7 @@ class KeywordsRecommendationRequest(BaseModel):
 
 class UserInteraction(BaseModel):
     user_id: str = Field(..., description="The unique identifier for the user.")
-    point_id: str = Field(..., description="The unique identifier of the content point in Qdrant.")
+    point_id: int = Field(..., description="The unsigned int64 identifier of the content point in Qdrant.")
     interaction_type: str = Field("like", description="The type of interaction (e.g., 'like', 'view').")
 
 class RecommendationResponse(BaseModel):
@@ -48,7 +48,7 @@ class KeywordsRecommendationResponse(BaseModel):
 class UserProfileResponse(BaseModel):
     user_id: str
     preferences: UserPreferences = Field(..., description="The user's preferences.")
-    interaction_history: List[str] = Field(..., description="List of point_ids the user has interacted with.")
+    interaction_history: List[int] = Field(..., description="List of point_ids the user has interacted with.")
 
 class HealthCheckResponse(BaseModel):
     api_status: str
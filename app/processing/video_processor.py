@@ -1,58 +1,69 @@
 import subprocess
-import json
-import glob
+import numpy as np
 from pathlib import Path
 import logging
 
 logger = logging.getLogger(__name__)
 
-def extract_frames(video_path, out_dir, fps = 1):
-    Path(out_dir).mkdir(parents=True, exist_ok=True)
+def sample_video_frames(video_path, fps = 1, max_frames = 128, size = 224):
+    """Decode sampled frames straight into a uint8 array.
+
+    ffmpeg scales and pipes raw RGB24 frames to stdout, so frames never
+    round-trip through JPEG files on disk. Returns an ndarray of shape
+    (N, size, size, 3) ready for the CLIP preprocessor, or None on
+    failure.
+    """
     cmd = [
         "ffmpeg", "-i", video_path,
-        "-vf", f"fps={fps}",
-        f"{out_dir}/frame_%04d.jpg",
-        "-loglevel", "error"
+        "-vf", f"fps={fps},scale={size}:{size}",
+        "-frames:v", str(max_frames),
+        "-f", "rawvideo", "-pix_fmt", "rgb24",
+        "-loglevel", "error", "pipe:1"
     ]
     try:
-        subprocess.run(cmd, check=True)
+        raw = subprocess.run(cmd, check=True, capture_output=True).stdout
     except subprocess.CalledProcessError as e:
         logger.error(f"Failed to extract frames from {video_path}: {e}")
-        return []
-
-    return sorted(glob.glob(f"{out_dir}/frame_*.jpg"))
+        return None
 
+    frame_bytes = size * size * 3
+    frame_count = len(raw) // frame_bytes
+    if frame_count == 0:
+        logger.error(f"No frames decoded from {video_path}")
+        return None
 
-def has_audio(video_path):
-    cmd = [
-        "ffprobe", "-v", "error",
-        "-select_streams", "a",
-        "-show_entries", "stream=index",
-        "-of", "json", video_path
-    ]
-    try:
-        output = subprocess.check_output(cmd, text=True)
-        return bool(json.loads(output).get("streams"))
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Failed to check audio presence in {video_path}: {e}")
-        return False
+    return np.frombuffer(raw[:frame_count * frame_bytes], dtype=np.uint8).reshape(frame_count, size, size, 3)
 
 
 def extract_audio(video_path, audio_out, sr = 16000):
-    if not has_audio(video_path):
-        logger.info(f"No audio stream found in {video_path} → skipping extraction.")
-        return None
+    """Extract a mono 16-bit PCM track, or return None if there is none.
 
-    Path(audio_out).parent.mkdir(parents=True, exist_ok=True)
+    A single ffmpeg invocation handles both detection and extraction:
+    "-map 0:a:0?" makes the audio stream optional, so no separate ffprobe
+    pass is needed (one process spawn and one container parse instead of
+    two). A video without audio makes ffmpeg exit non-zero with no output
+    file written ("Output file #0 does not contain any stream"), which is
+    the expected no-audio outcome, not a failure.
+    """
+    audio_out = Path(audio_out)
+    audio_out.parent.mkdir(parents=True, exist_ok=True)
     cmd = [
         "ffmpeg", "-i", video_path, "-vn",
+        "-map", "0:a:0?",
         "-ar", str(sr), "-ac", "1", "-c:a", "pcm_s16le",
-        audio_out, "-loglevel", "error", "-y"
+        str(audio_out), "-loglevel", "error", "-y", "-nostdin"
     ]
     try:
         subprocess.run(cmd, check=True)
     except subprocess.CalledProcessError as e:
-        logger.error(f"Failed to extract audio from {video_path}: {e}")
+        if not audio_out.exists() or audio_out.stat().st_size == 0:
+            logger.info(f"No audio stream found in {video_path} → skipping extraction.")
+        else:
+            logger.error(f"Failed to extract audio from {video_path}: {e}")
+        return None
+
+    if not audio_out.exists() or audio_out.stat().st_size == 0:
+        logger.info(f"No audio stream found in {video_path} → skipping extraction.")
         return None
 
-    return audio_out
+    return str(audio_out)
@@ -1,11 +1,13 @@
+import asyncio
+import heapq
 import logging
 import numpy as np
 from collections import defaultdict
-import uuid
+from functools import lru_cache
 from typing import List, Dict, Any
 
 from app.db import qdrant_ops
-from app.core.config import TEXT_VECTOR_NAME, VIDEO_VECTOR_NAME, AUDIO_VECTOR_NAME
+from app.core.config import TEXT_VECTOR_NAME, VIDEO_VECTOR_NAME, AUDIO_VECTOR_NAME, SERVER_SIDE_RECOMMEND
 from app.models.encoders import encoder
 from app.recommendation import user_service
 from qdrant_client import models
@@ -14,31 +16,58 @@ logger = logging.getLogger(__name__)
 
 VALID_VECTOR_NAMES = {TEXT_VECTOR_NAME, VIDEO_VECTOR_NAME, AUDIO_VECTOR_NAME}
 
-def build_user_profile_vector(point_ids: List[str]) -> Dict[str, np.ndarray]:
+# A mean over one or two vectors is mostly noise; searching with it
+# costs a full query for a weak signal, so such modalities are skipped.
+MIN_SAMPLES_PER_MODALITY = 3
+
+def _l2_normalize(vector: np.ndarray) -> np.ndarray:
+    # A mean of unit vectors is not itself unit-length; renormalizing
+    # makes DOT scores true cosines, so the cross-modality boost
+    # arithmetic compares like with like.
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+    return vector
+
+def build_user_profile_vector(point_ids: List[int]) -> Dict[str, np.ndarray]:
     if not point_ids:
         return {}
+    # Memoized on the sorted id tuple: until the user interacts again,
+    # repeat requests skip the Qdrant retrieve and the re-averaging.
+    return _cached_profile_vectors(tuple(sorted(point_ids)))
 
-    points = qdrant_ops.get_points_by_ids(point_ids)
+@lru_cache(maxsize=10_000)
+def _cached_profile_vectors(point_ids) -> Dict[str, np.ndarray]:
+    points = qdrant_ops.get_points_by_ids(list(point_ids))
     if not points:
         return {}
 
     vector_aggs = defaultdict(list)
+    # get_points_by_ids guarantees a dict of named vectors per point, so
+    # the loop is branch-free: a C-level set intersection on the keys
+    # view instead of shape and membership tests per point.
     for point in points:
-        if isinstance(point.vector, dict):
-            for vec_name, vector in point.vector.items():
-                if vec_name in VALID_VECTOR_NAMES and vector:
-                    vector_aggs[vec_name].append(np.array(vector))
+        point_vectors = point.vector
+        for vec_name in VALID_VECTOR_NAMES & point_vectors.keys():
+            vector = point_vectors[vec_name]
+            if vector:
+                vector_aggs[vec_name].append(vector)
 
     profile_vectors = {}
     for vec_name, vectors in vector_aggs.items():
-        if vectors:
-            profile_vectors[vec_name] = np.mean(vectors, axis=0)
-            logger.info(f"Generated profile vector for '{vec_name}'")
-            
+        if len(vectors) < MIN_SAMPLES_PER_MODALITY:
+            logger.info(f"Skipping '{vec_name}' profile: only {len(vectors)} interaction(s)")
+            continue
+        # One contiguous float32 stack + one vectorized mean instead
+        # of a numpy allocation per interaction vector.
+        mean_vector = np.asarray(vectors, dtype=np.float32).mean(axis=0)
+        profile_vectors[vec_name] = _l2_normalize(mean_vector)
+        logger.info(f"Generated profile vector for '{vec_name}'")
+
     return profile_vectors
 
-def get_recommendations_for_user(user_id: str, interaction_history: List[str], limit: int) -> List[Dict[str, Any]]:
-    
+async def get_recommendations_for_user(user_id: str, interaction_history: List[int], limit: int) -> List[Dict[str, Any]]:
+
     user_prefs = user_service.get_user_preferences(user_id)
     recommended_docs = {}
     
@@ -68,7 +97,7 @@ def get_recommendations_for_user(user_id: str, interaction_history: List[str], l
             logger.warning(f"User '{user_id}' has no preferences to filter by. Cannot recommend.")
             return []
 
-        candidate_points, _ = qdrant_ops.qdrant_client.scroll(
+        candidate_points, _ = await qdrant_ops.async_qdrant_client.scroll(
             collection_name=qdrant_ops.QDRANT_COLLECTION_NAME,
             scroll_filter=models.Filter(should=filter_conditions),
             limit=200,
@@ -77,8 +106,9 @@ def get_recommendations_for_user(user_id: str, interaction_history: List[str], l
         
         for point in candidate_points:
             payload = point.payload
+            content_type = payload.get('content_type', '')
             score = 1.0
-            if user_prefs.preferred_content_types and any(t in payload.get('content_type', '') for t in types_to_match):
+            if user_prefs.preferred_content_types and any(t in content_type for t in types_to_match):
                 score += 0.5
             if user_prefs.areas_of_interest and payload.get('category') in user_prefs.areas_of_interest:
                 score += 0.5
@@ -89,7 +119,7 @@ def get_recommendations_for_user(user_id: str, interaction_history: List[str], l
                     'doc_id': source_key,
                     'title': payload.get('title', 'Title not available'),
                     'filename': payload.get('original_filename'),
-                    'type': 'video' if 'video' in payload.get('content_type', '') else 'document',
+                    'type': 'video' if 'video' in content_type else 'document',
                     'similarity_score': score,
                     'best_matching_chunk_payload': payload,
                     'start_time': payload.get('start_time'),
@@ -98,116 +128,165 @@ def get_recommendations_for_user(user_id: str, interaction_history: List[str], l
 
     else:
         logger.info(f"Warm start for user '{user_id}'. Using interaction history.")
-        profile_vectors = build_user_profile_vector(interaction_history)
-        if not profile_vectors: return []
-
-        all_hits = []
-        for vec_name, profile_vector in profile_vectors.items():
-            all_hits.extend(qdrant_ops.search_similar_content(
-                vector=profile_vector,
-                vector_name=vec_name,
-                limit=limit * 2,
-                exclude_ids=interaction_history
-            ))
 
-        for hit in all_hits:
-            payload = hit.payload
-            source_key = payload.get('doc_id')
-            if not source_key: continue
+        # All per-modality queries travel in one batched round-trip; the
+        # server amortizes request parsing and we pay a single network
+        # latency instead of one per vector space.
+        if SERVER_SIDE_RECOMMEND:
+            # Qdrant's recommend API averages the stored interaction
+            # vectors on the server, which skips the client-side profile
+            # math. A point only carries its own modality's vectors (PDF
+            # chunks: text/image; videos: video+audio) and recommend
+            # rejects positives missing the `using` vector, so the
+            # history is partitioned by actual vector presence first —
+            # one lightweight vectors-only retrieve, which also lets the
+            # minimum-signal gate apply here.
+            points = await asyncio.to_thread(qdrant_ops.get_points_by_ids, interaction_history)
+            positives_by_space = defaultdict(list)
+            for point in points:
+                for vec_name in VALID_VECTOR_NAMES & point.vector.keys():
+                    if point.vector[vec_name]:
+                        positives_by_space[vec_name].append(point.id)
 
-            boost = 0.0
-            if user_prefs.preferred_content_types and "Video" in user_prefs.preferred_content_types and 'video' in payload.get('content_type', ''):
-                boost += 0.15
-            if user_prefs.areas_of_interest and payload.get('category') in user_prefs.areas_of_interest:
-                 boost += 0.1
-            
-            final_score = hit.score + boost
+            space_positives = []
+            for vec_name, positive_ids in positives_by_space.items():
+                if len(positive_ids) < MIN_SAMPLES_PER_MODALITY:
+                    logger.info(f"Skipping '{vec_name}' recommend: only {len(positive_ids)} interaction(s)")
+                    continue
+                space_positives.append((vec_name, positive_ids))
+            if not space_positives:
+                return []
 
-            if source_key not in recommended_docs or final_score > recommended_docs[source_key]['similarity_score']:
+            results = await qdrant_ops.arecommend_batch_content(space_positives, limit=limit * 2)
+        else:
+            # The running means maintained by user_service cost zero Qdrant
+            # calls; the fetch-and-average fallback (for histories recorded
+            # before the running sums existed) does network I/O, so it runs
+            # off the event loop.
+            profile_vectors = user_service.get_profile_means(user_id, min_samples=MIN_SAMPLES_PER_MODALITY) or \
+                await asyncio.to_thread(build_user_profile_vector, interaction_history)
+            if not profile_vectors: return []
+
+            # Exclusion rides on the indexed interacted_by field — constant
+            # filter size no matter how long the history grows.
+            results = await qdrant_ops.asearch_batch_content(
+                [(vec_name, profile_vector, limit * 2) for vec_name, profile_vector in profile_vectors.items()],
+                exclude_user=user_id
+            )
+        all_hits = [hit for hits in results for hit in hits]
+
+        if all_hits:
+            # Vectorized boost + dedup: per-hit Python arithmetic and dict
+            # probing is replaced by one numpy pass; only the winning hit
+            # per doc materializes a result dict.
+            doc_ids = np.array([hit.payload.get('doc_id') or '' for hit in all_hits])
+            scores = np.array([hit.score for hit in all_hits], dtype=np.float32)
+            content_types = np.array([hit.payload.get('content_type', '') for hit in all_hits])
+            categories = np.array([hit.payload.get('category') or '' for hit in all_hits])
+
+            if user_prefs.preferred_content_types and "Video" in user_prefs.preferred_content_types:
+                scores += np.where(np.char.find(content_types, 'video') >= 0, np.float32(0.15), np.float32(0.0))
+            if user_prefs.areas_of_interest:
+                scores += np.where(np.isin(categories, user_prefs.areas_of_interest), np.float32(0.1), np.float32(0.0))
+
+            # Sort by score descending; the first occurrence of each doc_id
+            # in that order is its best-scoring hit.
+            order = np.argsort(-scores, kind='stable')
+            _, first_positions = np.unique(doc_ids[order], return_index=True)
+
+            for position in order[first_positions]:
+                source_key = doc_ids[position]
+                if not source_key:
+                    continue
+                payload = all_hits[position].payload
                 recommended_docs[source_key] = {
                     'doc_id': source_key,
                     'title': payload.get('title', 'Title not available'),
                     'filename': payload.get('original_filename'),
-                    'type': 'video' if 'video' in payload.get('content_type', '') else 'document',
-                    'similarity_score': final_score,
+                    'type': 'video' if 'video' in content_types[position] else 'document',
+                    'similarity_score': float(scores[position]),
                     'best_matching_chunk_payload': payload,
                     'start_time': payload.get('start_time'),
                     'end_time': payload.get('end_time'),
                 }
 
-    sorted_recommendations = sorted(recommended_docs.values(), key=lambda x: x['similarity_score'], reverse=True)
-    logger.info(f"Generated {len(sorted_recommendations)} unique recommendations for user '{user_id}'")
-    
-    return sorted_recommendations[:limit]
+    # O(M log limit) instead of sorting every unique candidate just to
+    # keep the first `limit` of them.
+    top_recommendations = heapq.nlargest(limit, recommended_docs.values(), key=lambda x: x['similarity_score'])
+    logger.info(f"Selected top {len(top_recommendations)} of {len(recommended_docs)} unique recommendations for user '{user_id}'")
+
+    return top_recommendations
 
-def get_recommendations_for_keywords(keywords: List[str], per_keyword_limit: int, final_limit: int) -> List[Dict[str, Any]]:
+async def get_recommendations_for_keywords(keywords: List[str], per_keyword_limit: int, final_limit: int) -> List[Dict[str, Any]]:
     if not keywords:
         logger.warning("No keywords provided for recommendation search.")
         return []
 
-    all_recommendations = []
-    temporary_point_ids = []
-    
-    try:
-        for keyword in keywords:
-            logger.info(f"Searching for content similar to keyword: '{keyword}'")
-            
-            keyword_vector = encoder.encode_text(keyword)
-            if keyword_vector is None:
-                logger.warning(f"Could not encode keyword '{keyword}', skipping.")
-                continue
-            
-            temp_point_id = str(uuid.uuid4())
-            temp_payload = {"type": "temporary_keyword", "keyword": keyword, "text": keyword}
-            
-            success = qdrant_ops.insert_temporary_point(
-                point_id=temp_point_id,
-                vector=np.array(keyword_vector),
-                vector_name=TEXT_VECTOR_NAME,
-                payload=temp_payload
-            )
-            
-            if not success:
-                logger.error(f"Failed to insert temporary point for keyword '{keyword}', skipping.")
+    # Keyed by doc_id/filename: dedup is a dict probe instead of the old
+    # linear rescan plus list rebuild per hit (which also made the
+    # membership check against a list of dicts never match).
+    recommended_docs = {}
+
+    # One batched forward pass for every keyword instead of K serial
+    # batch-1 inferences; repeated single keywords still hit the
+    # encoder's content-hash cache via encode_text elsewhere. The forward
+    # passes hold the GIL-heavy models, so they run in a worker thread.
+    # Each vector space gets a query in its own embedding space: the
+    # sentence vector (384-dim) for text, CLIP text vectors (512-dim) for
+    # the CLIP-embedded video frames. The audio space has no text
+    # encoder, so it is not queried.
+    def _encode_keywords():
+        sentence_vectors = encoder.encode_texts(keywords)
+        clip_vectors = [encoder.encode_clip_text(keyword) for keyword in keywords]
+        return sentence_vectors, clip_vectors
+
+    sentence_vectors, clip_vectors = await asyncio.to_thread(_encode_keywords)
+
+    # Every (keyword, vector space) pair rides in a single batched RPC;
+    # spec_keywords records which keyword produced each request so the
+    # ordered results can be tagged back without a fixed stride.
+    search_specs = []
+    spec_keywords = []
+    for keyword, sentence_vector, clip_vector in zip(keywords, sentence_vectors, clip_vectors):
+        if sentence_vector is None or len(sentence_vector) == 0:
+            logger.warning(f"Could not encode keyword '{keyword}', skipping.")
+            continue
+        logger.info(f"Searching for content similar to keyword: '{keyword}'")
+        search_specs.append((TEXT_VECTOR_NAME, np.asarray(sentence_vector, dtype=np.float32), per_keyword_limit))
+        spec_keywords.append(keyword)
+        if clip_vector:
+            search_specs.append((VIDEO_VECTOR_NAME, np.asarray(clip_vector, dtype=np.float32), per_keyword_limit))
+            spec_keywords.append(keyword)
+
+    if not search_specs:
+        return []
+
+    results = await qdrant_ops.asearch_batch_content(search_specs)
+
+    tagged_hits = [(keyword, hit) for keyword, hits in zip(spec_keywords, results) for hit in hits]
+
+    if tagged_hits:
+        # Same vectorized dedup as the warm-start path: one stable
+        # argsort by score, then the first occurrence of each source key
+        # is its best hit; only winners materialize a result dict.
+        scores = np.fromiter((hit.score for _, hit in tagged_hits), dtype=np.float32, count=len(tagged_hits))
+        source_keys = np.array([hit.payload.get('doc_id') or hit.payload.get('filename') or '' for _, hit in tagged_hits])
+        order = np.argsort(-scores, kind='stable')
+        _, first_positions = np.unique(source_keys[order], return_index=True)
+
+        for position in order[first_positions]:
+            source_key = source_keys[position]
+            if not source_key:
                 continue
-            
-            temporary_point_ids.append(temp_point_id)
-            all_hits = []
-            
-            for vector_name in [TEXT_VECTOR_NAME, VIDEO_VECTOR_NAME, AUDIO_VECTOR_NAME]:
-                hits = qdrant_ops.search_similar_to_point(
-                    point_id=temp_point_id,
-                    vector_name=vector_name,
-                    limit=per_keyword_limit,
-                    exclude_ids=temporary_point_ids
-                )
-                all_hits.extend(hits)
-            
-            hits = sorted(all_hits, key=lambda x: x.score, reverse=True)
-            
-            for hit in hits:
-                payload = hit.payload
-                source_key = payload.get('doc_id') or payload.get('filename')
-                if not source_key: continue 
-
-                if source_key not in all_recommendations or hit.score > next((r['similarity_score'] for r in all_recommendations if r.get('doc_id') == source_key), -1):
-                    all_recommendations = [r for r in all_recommendations if r.get('doc_id') != source_key]
-                    response_item = {
-                        'doc_id': payload.get('doc_id'),
-                        'filename': payload.get('original_filename') or payload.get('filename'),
-                        'type': 'video' if 'video' in payload.get('type', '') else 'document',
-                        'similarity_score': hit.score,
-                        'keyword': keyword,
-                        'best_matching_chunk_payload': payload
-                    }
-                    all_recommendations.append(response_item)
-    finally:
-        for temp_point_id in temporary_point_ids:
-            try:
-                qdrant_ops.delete_point(temp_point_id)
-                logger.debug(f"Cleaned up temporary point: {temp_point_id}")
-            except Exception as e:
-                logger.warning(f"Failed to clean up temporary point {temp_point_id}: {e}")
-
-    sorted_recommendations = sorted(all_recommendations, key=lambda x: x['similarity_score'], reverse=True)
-    return sorted_recommendations[:final_limit]
\ No newline at end of file
+            keyword, hit = tagged_hits[position]
+            payload = hit.payload
+            recommended_docs[source_key] = {
+                'doc_id': payload.get('doc_id'),
+                'filename': payload.get('original_filename') or payload.get('filename'),
+                'type': 'video' if 'video' in payload.get('type', '') else 'document',
+                'similarity_score': hit.score,
+                'keyword': keyword,
+                'best_matching_chunk_payload': payload
+            }
+
+    return heapq.nlargest(final_limit, recommended_docs.values(), key=lambda x: x['similarity_score'])
\ No newline at end of file
@@ -1,20 +1,105 @@
 import logging
+import threading
 from collections import defaultdict
 from typing import Dict
+
+import numpy as np
+
+from app.core.config import TEXT_VECTOR_NAME, VIDEO_VECTOR_NAME, AUDIO_VECTOR_NAME
 from app.models.schemas import UserPreferences
 
 logger = logging.getLogger(__name__)
 
+_PROFILE_VECTOR_NAMES = {TEXT_VECTOR_NAME, VIDEO_VECTOR_NAME, AUDIO_VECTOR_NAME}
+
 user_interactions: Dict[str, set] = defaultdict(set)
-user_preferences: Dict[str, UserPreferences] = {} 
+user_preferences: Dict[str, UserPreferences] = {}
+
+# The running-sum updates below are read-modify-write, so GIL atomicity
+# is not enough. Locks are sharded by user id: concurrent requests for
+# different users only contend when they land on the same shard.
+_N_SHARDS = 16
+_shard_locks = [threading.Lock() for _ in range(_N_SHARDS)]
+
+def _user_lock(user_id):
+    return _shard_locks[hash(user_id) & (_N_SHARDS - 1)]
+
+# Running per-modality sums and counts, updated as interactions arrive.
+# The recommendation read path divides sum by count instead of
+# re-fetching and re-averaging the whole history from Qdrant.
+user_profile_sums: Dict[str, Dict[str, np.ndarray]] = defaultdict(dict)
+user_profile_counts: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
 
-def record_interaction(user_id, point_id):
-    logger.info(f"Recording interaction for user '{user_id}' with point '{point_id}'")
-    user_interactions[user_id].add(point_id)
+def _accumulate_profile_vectors(new_ids_by_user):
+    """Fold the vectors of newly seen points into each user's running sums."""
+    all_new_ids = list({point_id for ids in new_ids_by_user.values() for point_id in ids})
+    if not all_new_ids:
+        return
+
+    from app.db import qdrant_ops
+    # get_points_by_ids guarantees a dict of named vectors per point.
+    vectors_by_id = {point.id: point.vector for point in qdrant_ops.get_points_by_ids(all_new_ids)}
+
+    for user_id, new_ids in new_ids_by_user.items():
+        with _user_lock(user_id):
+            sums = user_profile_sums[user_id]
+            counts = user_profile_counts[user_id]
+            for point_id in new_ids:
+                for vec_name, vector in vectors_by_id.get(point_id, {}).items():
+                    if vec_name not in _PROFILE_VECTOR_NAMES or not vector:
+                        continue
+                    vector = np.asarray(vector, dtype=np.float32)
+                    if vec_name in sums:
+                        sums[vec_name] += vector
+                    else:
+                        sums[vec_name] = vector.copy()
+                    counts[vec_name] += 1
+
+def get_profile_means(user_id, min_samples = 1):
+    """Per-modality mean vectors from the running sums; {} if none recorded.
+
+    Modalities with fewer than min_samples interactions are left out —
+    their mean is noise, not signal.
+    """
+    with _user_lock(user_id):
+        sums = user_profile_sums.get(user_id)
+        if not sums:
+            return {}
+        counts = user_profile_counts[user_id]
+        means = {
+            vec_name: vec_sum / counts[vec_name]
+            for vec_name, vec_sum in sums.items()
+            if counts[vec_name] >= min_samples
+        }
+    # Renormalize outside the lock so search scores stay true cosines.
+    for vec_name, mean_vector in means.items():
+        norm = np.linalg.norm(mean_vector)
+        if norm > 0:
+            means[vec_name] = mean_vector / norm
+    return means
+
+def record_interactions(interactions):
+    """Record a batch of UserInteraction events drained from the write-behind queue."""
+    new_ids_by_user = defaultdict(list)
+    for interaction in interactions:
+        with _user_lock(interaction.user_id):
+            seen = user_interactions[interaction.user_id]
+            if interaction.point_id not in seen:
+                seen.add(interaction.point_id)
+                new_ids_by_user[interaction.user_id].append(interaction.point_id)
+    _accumulate_profile_vectors(new_ids_by_user)
+    if new_ids_by_user:
+        from app.db import qdrant_ops
+        for user_id, new_ids in new_ids_by_user.items():
+            qdrant_ops.mark_points_interacted(user_id, new_ids)
+    logger.info(f"Recorded batch of {len(interactions)} interactions")
     return True
 
 def get_user_interactions(user_id):
-    interactions = list(user_interactions.get(user_id, []))
+    # Snapshot under the shard lock so concurrent writers can't mutate
+    # the set mid-materialization.
+    with _user_lock(user_id):
+        interactions = list(user_interactions.get(user_id, ()))
     logger.info(f"Retrieved {len(interactions)} interactions for user '{user_id}'")
     return interactions
 
@@ -23,9 +108,12 @@ def save_user_preferences(user_id, preferences: UserPreferences):
     user_preferences[user_id] = preferences
     return True
 
+# Built once; validating a Pydantic model per lookup is wasted work for
+# every request from a user without saved preferences.
+_DEFAULT_PREFS = UserPreferences(domaines_interets=[], types_contenus=[], objectifs_apprentissage=[])
+
 def get_user_preferences(user_id):
-    default_prefs = UserPreferences(domaines_interets=[], types_contenus=[], objectifs_apprentissage=[])
-    prefs = user_preferences.get(user_id, default_prefs)
+    prefs = user_preferences.get(user_id, _DEFAULT_PREFS)
     logger.info(f"Retrieved preferences for user '{user_id}'")
     return prefs
 